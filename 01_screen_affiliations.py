@@ -4,15 +4,108 @@ Step 1: Screen PubMed for affiliation variations of DCTV and DSF departments.
 This script searches for various ways the departments might be written.
 """
 
-import urllib.request
+import gzip
+import heapq
+import http.client
+import json
+import os
 import urllib.parse
 import xml.etree.ElementTree as ET
+import threading
 import time
 import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
+# NCBI E-utilities identification; with an API key the rate limit rises from 3 to 10 requests/s
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY', '')
+NCBI_TOOL = os.environ.get('NCBI_TOOL', 'articoli_dctv_dsf')
+NCBI_EMAIL = os.environ.get('NCBI_EMAIL', '')
+
+# Concurrent requests, spaced to stay under the NCBI rate limit
+MAX_WORKERS = 9
+REQUEST_INTERVAL = 0.11 if NCBI_API_KEY else 0.34
+
+# Transient NCBI errors (rate limiting, overload) are retried with exponential backoff
+HTTP_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+def wait_for_rate_limit():
+    """Block until the next request slot is available (shared by all threads)."""
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        delay = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + REQUEST_INTERVAL
+    if delay > 0:
+        time.sleep(delay)
+
+def eutils_params(params):
+    """Add the API key and tool/email identification to E-utilities parameters."""
+    params = dict(params, tool=NCBI_TOOL)
+    if NCBI_EMAIL:
+        params['email'] = NCBI_EMAIL
+    if NCBI_API_KEY:
+        params['api_key'] = NCBI_API_KEY
+    return params
+
+def eutils_url(endpoint, params):
+    """Build an E-utilities GET URL."""
+    return BASE_URL + endpoint + "?" + urllib.parse.urlencode(eutils_params(params))
+
+# One kept-alive HTTPS connection per worker thread, so the TLS handshake
+# is paid once per thread rather than once per request
+_connections = threading.local()
+
+def eutils_request(url, data=None):
+    """GET an E-utilities URL, or POST form-encoded `data` to it, and return the body (bytes).
+    
+    Responses are requested gzip-compressed; PubMed XML shrinks about tenfold.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path + "?" + parts.query if parts.query else parts.path
+    
+    for attempt in range(MAX_RETRIES + 1):
+        wait_for_rate_limit()
+        conn = getattr(_connections, 'conn', None)
+        if conn is None:
+            conn = _connections.conn = http.client.HTTPSConnection(parts.netloc, timeout=HTTP_TIMEOUT)
+        try:
+            if data is None:
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            else:
+                conn.request('POST', path, body=data,
+                             headers={'Accept-Encoding': 'gzip',
+                                      'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            body = response.read()
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            _connections.conn = None
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status == 200:
+                return body
+            if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
 def search_pubmed(query, retmax=100):
     """Search PubMed and return PMIDs."""
     params = {
@@ -21,13 +114,12 @@ def search_pubmed(query, retmax=100):
         'retmax': retmax,
         'retmode': 'json'
     }
-    url = BASE_URL + "esearch.fcgi?" + urllib.parse.urlencode(params)
+    url = eutils_url("esearch.fcgi", params)
     
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            import json
-            data = json.loads(response.read().decode())
-            return data.get('esearchresult', {}).get('idlist', [])
+        body = eutils_request(url)
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+        return data.get('esearchresult', {}).get('idlist', [])
     except Exception as e:
         print(f"Error searching: {e}")
         return []
@@ -35,28 +127,34 @@ def search_pubmed(query, retmax=100):
 def fetch_abstracts_with_affiliations(pmids):
     """Fetch article details including affiliations."""
     if not pmids:
-        return []
+        return b""
     
     params = {
         'db': 'pubmed',
         'id': ','.join(pmids),
         'retmode': 'xml'
     }
-    url = BASE_URL + "efetch.fcgi?" + urllib.parse.urlencode(params)
+    # POST keeps the PMID list out of the URL; commas are left unescaped
+    data = urllib.parse.urlencode(eutils_params(params), safe=',').encode()
     
     try:
-        with urllib.request.urlopen(url, timeout=60) as response:
-            return response.read().decode()
+        # Keep raw bytes so the parser honours the XML encoding declaration
+        return eutils_request(BASE_URL + "efetch.fcgi", data)
     except Exception as e:
         print(f"Error fetching: {e}")
-        return ""
+        return b""
 
 def extract_affiliations(xml_data):
-    """Extract affiliations from PubMed XML."""
+    """Extract affiliations from PubMed XML (bytes), streaming one article at a time."""
     affiliations = []
+    if not xml_data:
+        return affiliations
     try:
-        root = ET.fromstring(xml_data)
-        for article in root.findall('.//PubmedArticle'):
+        context = ET.iterparse(BytesIO(xml_data), events=('start', 'end'))
+        _, root = next(context)
+        for event, article in context:
+            if event != 'end' or article.tag != 'PubmedArticle':
+                continue
             pmid = article.find('.//PMID')
             pmid_text = pmid.text if pmid is not None else "Unknown"
             
@@ -68,11 +166,28 @@ def extract_affiliations(xml_data):
             for aff in article.findall('.//AffiliationInfo/Affiliation'):
                 if aff.text:
                     affiliations.append((pmid_text, aff.text))
+            
+            # Drop the processed article so memory stays bounded
+            root.clear()
     except Exception as e:
         print(f"Error parsing XML: {e}")
     
     return affiliations
 
+def pmid_key(pmid):
+    """Sort key ordering PMIDs numerically, with placeholders like "Unknown" last."""
+    return (0, int(pmid)) if pmid.isdigit() else (1, 0)
+
+def search_and_fetch(queries, retmax=50):
+    """Run all searches and their fetches concurrently.
+    
+    Returns (query, pmids, xml_data) tuples in the order of the queries.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        pmid_lists = list(executor.map(lambda q: search_pubmed(q, retmax=retmax), queries))
+        xml_payloads = list(executor.map(fetch_abstracts_with_affiliations, pmid_lists))
+    return list(zip(queries, pmid_lists, xml_payloads))
+
 def main():
     print("=" * 80)
     print("SCREENING PUBMED FOR DEPARTMENT AFFILIATION VARIATIONS")
@@ -106,31 +221,23 @@ def main():
     print("(Dipartimento di Scienze Cardio-Toraco-Vascolari e Sanità Pubblica)")
     print("=" * 80)
     
-    dctv_affiliations = defaultdict(list)
+    dctv_affiliations = defaultdict(set)
     
-    for query in dctv_queries:
+    for query, pmids, xml_data in search_and_fetch(dctv_queries):
         print(f"\nSearching: {query}")
-        pmids = search_pubmed(query, retmax=50)
         print(f"  Found {len(pmids)} results")
         
-        if pmids:
-            time.sleep(0.5)  # Be nice to NCBI
-            xml_data = fetch_abstracts_with_affiliations(pmids)
-            affs = extract_affiliations(xml_data)
-            
-            for pmid, aff in affs:
-                # Filter for Padova-related affiliations
-                if 'padov' in aff.lower() or 'padua' in aff.lower():
-                    dctv_affiliations[aff].append(pmid)
-        
-        time.sleep(0.5)
+        for pmid, aff in extract_affiliations(xml_data):
+            # Filter for Padova-related affiliations
+            if 'padov' in aff.lower() or 'padua' in aff.lower():
+                dctv_affiliations[aff].add(pmid)
     
     print("\n" + "-" * 40)
     print("UNIQUE DCTV-RELATED AFFILIATIONS FOUND:")
     print("-" * 40)
     
-    for i, (aff, pmids) in enumerate(sorted(dctv_affiliations.items(), key=lambda x: -len(x[1]))[:30], 1):
-        print(f"\n{i}. [{len(pmids)} articles] Example PMID: {pmids[0]}")
+    for i, (aff, pmids) in enumerate(heapq.nlargest(30, dctv_affiliations.items(), key=lambda kv: len(kv[1])), 1):
+        print(f"\n{i}. [{len(pmids)} articles] Example PMID: {min(pmids, key=pmid_key)}")
         print(f"   {aff[:200]}{'...' if len(aff) > 200 else ''}")
     
     print("\n" + "=" * 80)
@@ -138,30 +245,22 @@ def main():
     print("(Dipartimento di Scienze del Farmaco)")
     print("=" * 80)
     
-    dsf_affiliations = defaultdict(list)
+    dsf_affiliations = defaultdict(set)
     
-    for query in dsf_queries:
+    for query, pmids, xml_data in search_and_fetch(dsf_queries):
         print(f"\nSearching: {query}")
-        pmids = search_pubmed(query, retmax=50)
         print(f"  Found {len(pmids)} results")
         
-        if pmids:
-            time.sleep(0.5)
-            xml_data = fetch_abstracts_with_affiliations(pmids)
-            affs = extract_affiliations(xml_data)
-            
-            for pmid, aff in affs:
-                if 'padov' in aff.lower() or 'padua' in aff.lower():
-                    dsf_affiliations[aff].append(pmid)
-        
-        time.sleep(0.5)
+        for pmid, aff in extract_affiliations(xml_data):
+            if 'padov' in aff.lower() or 'padua' in aff.lower():
+                dsf_affiliations[aff].add(pmid)
     
     print("\n" + "-" * 40)
     print("UNIQUE DSF-RELATED AFFILIATIONS FOUND:")
     print("-" * 40)
     
-    for i, (aff, pmids) in enumerate(sorted(dsf_affiliations.items(), key=lambda x: -len(x[1]))[:30], 1):
-        print(f"\n{i}. [{len(pmids)} articles] Example PMID: {pmids[0]}")
+    for i, (aff, pmids) in enumerate(heapq.nlargest(30, dsf_affiliations.items(), key=lambda kv: len(kv[1])), 1):
+        print(f"\n{i}. [{len(pmids)} articles] Example PMID: {min(pmids, key=pmid_key)}")
         print(f"   {aff[:200]}{'...' if len(aff) > 200 else ''}")
     
     # Save results to file
@@ -172,14 +271,14 @@ def main():
         f.write("DCTV DEPARTMENT VARIATIONS:\n")
         f.write("-" * 40 + "\n")
         for aff, pmids in sorted(dctv_affiliations.items(), key=lambda x: -len(x[1])):
-            f.write(f"\n[{len(pmids)} articles] PMIDs: {', '.join(pmids[:5])}{'...' if len(pmids) > 5 else ''}\n")
+            f.write(f"\n[{len(pmids)} articles] PMIDs: {', '.join(sorted(pmids, key=pmid_key)[:5])}{'...' if len(pmids) > 5 else ''}\n")
             f.write(f"{aff}\n")
         
         f.write("\n\n" + "=" * 80 + "\n")
         f.write("DSF DEPARTMENT VARIATIONS:\n")
         f.write("-" * 40 + "\n")
         for aff, pmids in sorted(dsf_affiliations.items(), key=lambda x: -len(x[1])):
-            f.write(f"\n[{len(pmids)} articles] PMIDs: {', '.join(pmids[:5])}{'...' if len(pmids) > 5 else ''}\n")
+            f.write(f"\n[{len(pmids)} articles] PMIDs: {', '.join(sorted(pmids, key=pmid_key)[:5])}{'...' if len(pmids) > 5 else ''}\n")
             f.write(f"{aff}\n")
     
     print("\n" + "=" * 80)
@@ -7,17 +7,144 @@ DCTV = Dipartimento di Scienze Cardio-Toraco-Vascolari e Sanità Pubblica
 DSF = Dipartimento di Scienze del Farmaco (Pharmaceutical and Pharmacological Sciences)
 """
 
-import urllib.request
+import gzip
+import hashlib
+import http.client
+import os
+import sqlite3
 import urllib.parse
 import xml.etree.ElementTree as ET
+import threading
 import time
 import json
-import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from itertools import chain
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
+# NCBI E-utilities identification; with an API key the rate limit rises from 3 to 10 requests/s
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY', '')
+NCBI_TOOL = os.environ.get('NCBI_TOOL', 'articoli_dctv_dsf')
+NCBI_EMAIL = os.environ.get('NCBI_EMAIL', '')
+
+# Concurrent requests, spaced to stay under the NCBI rate limit
+MAX_WORKERS = 9
+REQUEST_INTERVAL = 0.11 if NCBI_API_KEY else 0.34
+
+# Transient NCBI errors (rate limiting, overload) are retried with exponential backoff
+HTTP_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+def wait_for_rate_limit():
+    """Block until the next request slot is available (shared by all threads)."""
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        delay = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + REQUEST_INTERVAL
+    if delay > 0:
+        time.sleep(delay)
+
+def eutils_params(params):
+    """Add the API key and tool/email identification to E-utilities parameters."""
+    params = dict(params, tool=NCBI_TOOL)
+    if NCBI_EMAIL:
+        params['email'] = NCBI_EMAIL
+    if NCBI_API_KEY:
+        params['api_key'] = NCBI_API_KEY
+    return params
+
+# Parameters that never change between requests, percent-encoded once at import
+_ESEARCH_TAIL = "&" + urllib.parse.urlencode(eutils_params({'db': 'pubmed', 'retmode': 'json'}))
+_EFETCH_HEAD = urllib.parse.urlencode(eutils_params({'db': 'pubmed', 'retmode': 'xml'}))
+
+# On-disk cache of EFetch pages, so reruns only repeat the (cheap) ESearch calls.
+# Set PUBMED_CACHE to an empty string to disable it.
+CACHE_FILE = os.environ.get('PUBMED_CACHE', 'pubmed_cache.sqlite')
+CACHE_TTL = 7 * 24 * 3600  # seconds
+
+_cache_lock = threading.Lock()
+_cache_db = None
+
+def cache_get(key):
+    """Return the cached body stored under key, or None if missing or expired."""
+    global _cache_db
+    if not CACHE_FILE:
+        return None
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    with _cache_lock:
+        if _cache_db is None:
+            _cache_db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+            _cache_db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, body BLOB)')
+        row = _cache_db.execute('SELECT stored_at, body FROM responses WHERE key = ?', (digest,)).fetchone()
+    if row is None or time.time() - row[0] > CACHE_TTL:
+        return None
+    return row[1]
+
+def cache_put(key, body):
+    """Store body under key (the cache is opened by an earlier cache_get)."""
+    if not CACHE_FILE or _cache_db is None:
+        return
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    with _cache_lock:
+        _cache_db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (digest, time.time(), body))
+        _cache_db.commit()
+
+# One kept-alive HTTPS connection per worker thread, so the TLS handshake
+# is paid once per thread rather than once per request
+_connections = threading.local()
+
+def eutils_request(url, data=None):
+    """GET an E-utilities URL, or POST form-encoded `data` to it, and return the body (bytes).
+    
+    Responses are requested gzip-compressed; PubMed XML shrinks about tenfold.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path + "?" + parts.query if parts.query else parts.path
+    
+    for attempt in range(MAX_RETRIES + 1):
+        wait_for_rate_limit()
+        conn = getattr(_connections, 'conn', None)
+        if conn is None:
+            conn = _connections.conn = http.client.HTTPSConnection(parts.netloc, timeout=HTTP_TIMEOUT)
+        try:
+            if data is None:
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            else:
+                conn.request('POST', path, body=data,
+                             headers={'Accept-Encoding': 'gzip',
+                                      'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            body = response.read()
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            _connections.conn = None
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status == 200:
+                return body
+            if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
 # Affiliation patterns based on screening results
+# Each pattern is a sequence of lowercase keywords separated by ".*"
 DCTV_PATTERNS = [
     # English variations
     "cardiac.*thoracic.*vascular.*public.*health",
@@ -40,140 +167,244 @@ DSF_PATTERNS = [
     # Note: DSF alone is too generic
 ]
 
+# Patterns split into keyword chains, matched with ordered substring scans
+DCTV_KEYWORDS = tuple(tuple(p.split(".*")) for p in DCTV_PATTERNS)
+DSF_KEYWORDS = tuple(tuple(p.split(".*")) for p in DSF_PATTERNS)
+
 def search_pubmed(query, retmax=500):
-    """Search PubMed and return PMIDs."""
+    """Search PubMed and return (PMIDs, total count)."""
+    url = (BASE_URL + "esearch.fcgi?term=" + urllib.parse.quote_plus(query)
+           + f"&retmax={retmax}" + _ESEARCH_TAIL)
+    
+    try:
+        body = eutils_request(url)
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+        result = data.get('esearchresult', {})
+        count = result.get('count', '0')
+        pmids = result.get('idlist', [])
+        return pmids, int(count)
+    except Exception as e:
+        print(f"Error searching: {e}")
+        return [], 0
+
+def is_article_set(body):
+    """Check that an EFetch body is a complete PubmedArticleSet with no <ERROR>.
+    
+    NCBI reports some failures inside HTTP 200 responses. Only the root start
+    tag is parsed; the rest is a byte scan, so no tree of the page is built.
+    """
+    if b'<ERROR>' in body or not body.rstrip().endswith(b'</PubmedArticleSet>'):
+        return False
+    try:
+        _, root = next(ET.iterparse(BytesIO(body), events=('start',)))
+    except (ET.ParseError, StopIteration):
+        return False
+    return root.tag == 'PubmedArticleSet'
+
+def post_pmids(pmids):
+    """Upload PMIDs to the NCBI history server (EPost); return (WebEnv, QueryKey)."""
     params = {
         'db': 'pubmed',
-        'term': query,
-        'retmax': retmax,
-        'retmode': 'json',
-        'usehistory': 'y'
+        'id': ','.join(pmids),
     }
-    url = BASE_URL + "esearch.fcgi?" + urllib.parse.urlencode(params)
+    data = urllib.parse.urlencode(eutils_params(params), safe=',').encode()
+    root = ET.fromstring(eutils_request(BASE_URL + "epost.fcgi", data))
+    webenv = root.findtext('WebEnv')
+    query_key = root.findtext('QueryKey')
+    if not webenv or not query_key:
+        raise ValueError(f"no WebEnv/QueryKey in EPost response: {root.findtext('.//ERROR') or root.tag}")
+    return webenv, query_key
+
+def fetch_page(webenv, query_key, page_pmids, retstart, retmax=500):
+    """Fetch one page of a history-server result set as raw XML (bytes).
+    
+    EFetch is sent as a POST so the parameters travel in the request body.
+    """
+    cache_key = "efetch|" + ','.join(page_pmids)
+    data = (f"{_EFETCH_HEAD}&WebEnv={urllib.parse.quote_plus(webenv)}&query_key={query_key}"
+            f"&retstart={retstart}&retmax={retmax}").encode()
     
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            data = json.loads(response.read().decode())
-            result = data.get('esearchresult', {})
-            count = result.get('count', '0')
-            pmids = result.get('idlist', [])
-            print(f"  Total count: {count}, Retrieved: {len(pmids)}")
-            return pmids
+        body = eutils_request(BASE_URL + "efetch.fcgi", data)
     except Exception as e:
-        print(f"Error searching: {e}")
-        return []
+        print(f"Error fetching batch: {e}")
+        return b""
+    if CACHE_FILE and is_article_set(body):
+        cache_put(cache_key, body)
+    return body
 
 def fetch_articles(pmids):
-    """Fetch article details including affiliations."""
-    if not pmids:
-        return ""
-    
-    # Fetch in batches of 100
-    all_xml = ""
-    for i in range(0, len(pmids), 100):
-        batch = pmids[i:i+100]
-        params = {
-            'db': 'pubmed',
-            'id': ','.join(batch),
-            'retmode': 'xml'
-        }
-        url = BASE_URL + "efetch.fcgi?" + urllib.parse.urlencode(params)
-        
-        try:
-            with urllib.request.urlopen(url, timeout=60) as response:
-                all_xml += response.read().decode()
-            time.sleep(0.4)
-        except Exception as e:
-            print(f"Error fetching batch: {e}")
+    """Fetch article details including affiliations.
+    
+    The deduplicated PMIDs are posted once to the history server and paged
+    500 records at a time, so articles found by several queries are fetched
+    once. Pages are cached by the PMIDs they cover (the WebEnv changes on
+    every post, so it cannot be part of the cache key); EPost is skipped
+    when every page is cached. Returns one raw XML payload (bytes) per page.
+    """
+    pages = [(retstart, pmids[retstart:retstart + 500]) for retstart in range(0, len(pmids), 500)]
+    payloads = [cache_get("efetch|" + ','.join(page_pmids)) for _, page_pmids in pages]
+    missing = [page for page, payload in zip(pages, payloads) if payload is None]
+    if not missing:
+        return payloads
     
-    return all_xml
+    try:
+        webenv, query_key = post_pmids(pmids)
+    except Exception as e:
+        print(f"Error posting PMIDs: {e}")
+        return [payload for payload in payloads if payload is not None]
+    
+    # All missing pages in flight concurrently
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        fetched = iter(executor.map(
+            lambda page: fetch_page(webenv, query_key, page[1], page[0]), missing))
+        return [payload if payload is not None else next(fetched) for payload in payloads]
 
-def parse_articles(xml_data):
-    """Parse PubMed XML and extract article info with affiliations."""
-    articles = []
+def extract_article(article):
+    """Extract article info from one <PubmedArticle> in a single traversal."""
+    pmid_elem = title_elem = journal_elem = year_elem = medline_date_elem = None
+    info_affiliations = []
+    all_affiliations = []
+    authors = []
     
-    # Handle multiple XML documents concatenated
-    xml_chunks = xml_data.split('<?xml version="1.0"')
+    for elem in article.iter():
+        tag = elem.tag
+        if tag == 'PMID':
+            if pmid_elem is None:
+                pmid_elem = elem
+        elif tag == 'ArticleTitle':
+            if title_elem is None:
+                title_elem = elem
+        elif tag == 'Journal':
+            if journal_elem is None:
+                journal_elem = elem.find('Title')
+        elif tag == 'PubDate':
+            if year_elem is None:
+                year_elem = elem.find('Year')
+            if medline_date_elem is None:
+                medline_date_elem = elem.find('MedlineDate')
+        elif tag == 'AffiliationInfo':
+            info_affiliations.extend(aff.text for aff in elem.findall('Affiliation') if aff.text)
+        elif tag == 'Affiliation':
+            if elem.text:
+                all_affiliations.append(elem.text)
+        elif tag == 'Author':
+            lastname = elem.find('LastName')
+            forename = elem.find('ForeName')
+            if lastname is not None:
+                name = lastname.text
+                if forename is not None:
+                    name += " " + forename.text
+                authors.append(name)
     
-    for chunk in xml_chunks:
-        if not chunk.strip():
-            continue
-        if not chunk.startswith('<?xml'):
-            chunk = '<?xml version="1.0"' + chunk
+    pmid = pmid_elem.text if pmid_elem is not None else "Unknown"
+    title = title_elem.text if title_elem is not None else "No title"
+    journal = journal_elem.text if journal_elem is not None else ""
+    
+    if year_elem is None:
+        year_elem = medline_date_elem
+    year = year_elem.text[:4] if year_elem is not None and year_elem.text else ""
+    
+    # AffiliationInfo entries first, then old-style affiliations not seen yet
+    affiliations = info_affiliations
+    seen = set(affiliations)
+    for aff in all_affiliations:
+        if aff not in seen:
+            seen.add(aff)
+            affiliations.append(aff)
+    
+    return {
+        'pmid': pmid,
+        'title': title,
+        'journal': journal,
+        'year': year,
+        'authors': authors,
+        'affiliations': affiliations
+    }
+
+def parse_articles_bytes(xml_data):
+    """Parse one PubMed XML payload and extract article info with affiliations.
+    
+    The payload is streamed with iterparse and every <PubmedArticle> is
+    discarded once extracted, so memory stays bounded by one article.
+    """
+    articles = []
+    if not xml_data:
+        return articles
+    
+    try:
+        context = ET.iterparse(BytesIO(xml_data), events=('start', 'end'))
+        _, root = next(context)
         
-        try:
-            root = ET.fromstring(chunk)
+        for event, article in context:
+            if event != 'end' or article.tag != 'PubmedArticle':
+                continue
             
-            for article in root.findall('.//PubmedArticle'):
-                pmid_elem = article.find('.//PMID')
-                pmid = pmid_elem.text if pmid_elem is not None else "Unknown"
-                
-                # Get title
-                title_elem = article.find('.//ArticleTitle')
-                title = title_elem.text if title_elem is not None else "No title"
-                
-                # Get journal
-                journal_elem = article.find('.//Journal/Title')
-                journal = journal_elem.text if journal_elem is not None else ""
-                
-                # Get year
-                year_elem = article.find('.//PubDate/Year')
-                if year_elem is None:
-                    year_elem = article.find('.//PubDate/MedlineDate')
-                year = year_elem.text[:4] if year_elem is not None and year_elem.text else ""
-                
-                # Get all affiliations
-                affiliations = []
-                for aff in article.findall('.//AffiliationInfo/Affiliation'):
-                    if aff.text:
-                        affiliations.append(aff.text)
-                
-                # Also check old-style affiliations
-                for aff in article.findall('.//Affiliation'):
-                    if aff.text and aff.text not in affiliations:
-                        affiliations.append(aff.text)
-                
-                # Get authors
-                authors = []
-                for author in article.findall('.//Author'):
-                    lastname = author.find('LastName')
-                    forename = author.find('ForeName')
-                    if lastname is not None:
-                        name = lastname.text
-                        if forename is not None:
-                            name += " " + forename.text
-                        authors.append(name)
-                
-                articles.append({
-                    'pmid': pmid,
-                    'title': title,
-                    'journal': journal,
-                    'year': year,
-                    'authors': authors,
-                    'affiliations': affiliations
-                })
-        except ET.ParseError as e:
-            continue
+            articles.append(extract_article(article))
+            
+            # Release the processed article before parsing the next one
+            root.clear()
+    except ET.ParseError:
+        pass
     
     return articles
 
-def check_affiliation_match(affiliations, patterns):
-    """Check if any affiliation matches any pattern."""
-    all_affs = ' '.join(affiliations).lower()
-    for pattern in patterns:
-        if re.search(pattern, all_affs, re.IGNORECASE):
+def parse_articles(payloads):
+    """Parse all EFetch payloads, one worker process per CPU.
+    
+    Payloads are independent, so XML parsing (CPU-bound) scales with cores.
+    """
+    if len(payloads) < 2:
+        return [a for xml_data in payloads for a in parse_articles_bytes(xml_data)]
+    
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return list(chain.from_iterable(executor.map(parse_articles_bytes, payloads)))
+
+def match_keywords(text, chains):
+    """Check if every keyword of any chain occurs in order in the lowercased text.
+    
+    Equivalent to re.search("k1.*k2.*...") for each chain, but uses str.find
+    so no regex backtracking is involved.
+    """
+    for keywords_chain in chains:
+        pos = 0
+        for keyword in keywords_chain:
+            pos = text.find(keyword, pos)
+            if pos < 0:
+                break
+            pos += len(keyword)
+        else:
             return True
     return False
 
-def get_matching_affiliations(affiliations, patterns):
-    """Get the specific affiliations that match the patterns."""
-    matches = []
-    for aff in affiliations:
-        for pattern in patterns:
-            if re.search(pattern, aff, re.IGNORECASE):
-                matches.append(aff)
-                break
-    return matches
+# The same affiliation strings recur across many articles, so lowercasing
+# and per-affiliation matching are memoized on the string itself
+@lru_cache(maxsize=4096)
+def lower_affiliation(aff):
+    """Return the lowercased affiliation, shared between repeated strings."""
+    return aff.lower()
+
+@lru_cache(maxsize=4096)
+def affiliation_matches(aff_lower, chains):
+    """Cached match_keywords for a single lowercased affiliation."""
+    return match_keywords(aff_lower, chains)
+
+def check_affiliation_match(all_affs_lower, chains):
+    """Check if the joined, lowercased affiliations match the department keyword chains."""
+    return match_keywords(all_affs_lower, chains)
+
+def get_matching_affiliations(affiliations, chains):
+    """Get the specific affiliations that match the department keyword chains."""
+    return [aff for aff in affiliations if affiliation_matches(lower_affiliation(aff), chains)]
+
+def write_json(path, data):
+    """Write data as indented UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
 
 def main():
     print("=" * 80)
@@ -210,11 +441,13 @@ def main():
     print("SEARCHING PUBMED...")
     print("-" * 40)
     
-    for query in search_queries:
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(search_pubmed, search_queries))
+    
+    for query, (pmids, count) in zip(search_queries, results):
         print(f"\nQuery: {query[:70]}...")
-        pmids = search_pubmed(query, retmax=500)
+        print(f"  Total count: {count}, Retrieved: {len(pmids)}")
         all_pmids.update(pmids)
-        time.sleep(0.5)
     
     print(f"\n\nTotal unique PMIDs collected: {len(all_pmids)}")
     
@@ -226,8 +459,13 @@ def main():
     print("FETCHING ARTICLE DETAILS...")
     print("-" * 40)
     
-    xml_data = fetch_articles(list(all_pmids))
-    articles = parse_articles(xml_data)
+    # Sorted so pages (and their cache keys) are stable between runs
+    payloads = fetch_articles(sorted(all_pmids, key=int))
+    articles = parse_articles(payloads)
+    
+    # Join and lowercase each article's affiliations once; every filter test reuses it
+    for article in articles:
+        article['_joined_lower'] = ' '.join(map(lower_affiliation, article['affiliations']))
     
     print(f"Parsed {len(articles)} articles")
     
@@ -239,45 +477,30 @@ def main():
     collaborations = []
     
     for article in articles:
-        has_dctv = check_affiliation_match(article['affiliations'], DCTV_PATTERNS)
-        has_dsf = check_affiliation_match(article['affiliations'], DSF_PATTERNS)
+        # Cheapest test first: it must actually be Padova
+        all_affs = article['_joined_lower']
+        if 'padov' not in all_affs and 'padua' not in all_affs:
+            continue
         
-        if has_dctv and has_dsf:
-            # Also check it's actually Padova
-            all_affs = ' '.join(article['affiliations']).lower()
-            if 'padov' in all_affs or 'padua' in all_affs:
-                article['dctv_affiliations'] = get_matching_affiliations(article['affiliations'], DCTV_PATTERNS)
-                article['dsf_affiliations'] = get_matching_affiliations(article['affiliations'], DSF_PATTERNS)
-                collaborations.append(article)
+        if (check_affiliation_match(all_affs, DCTV_KEYWORDS)
+                and check_affiliation_match(all_affs, DSF_KEYWORDS)):
+            article['dctv_affiliations'] = get_matching_affiliations(article['affiliations'], DCTV_KEYWORDS)
+            article['dsf_affiliations'] = get_matching_affiliations(article['affiliations'], DSF_KEYWORDS)
+            collaborations.append(article)
     
     print(f"\nFound {len(collaborations)} collaborative articles!")
     
     # Sort by year (most recent first)
     collaborations.sort(key=lambda x: x.get('year', '0000'), reverse=True)
     
-    # Display results
+    # Display results and write the text report in the same pass
     print("\n" + "=" * 80)
     print("COLLABORATIVE PUBLICATIONS (DCTV + DSF)")
     print("=" * 80)
     
-    for i, article in enumerate(collaborations, 1):
-        print(f"\n{'='*80}")
-        print(f"[{i}] PMID: {article['pmid']}")
-        print(f"Year: {article['year']}")
-        print(f"Title: {article['title']}")
-        print(f"Journal: {article['journal']}")
-        print(f"Authors: {', '.join(article['authors'][:5])}{'...' if len(article['authors']) > 5 else ''}")
-        print(f"\nDCTV Affiliation(s):")
-        for aff in article['dctv_affiliations'][:2]:
-            print(f"  - {aff[:150]}{'...' if len(aff) > 150 else ''}")
-        print(f"\nDSF Affiliation(s):")
-        for aff in article['dsf_affiliations'][:2]:
-            print(f"  - {aff[:150]}{'...' if len(aff) > 150 else ''}")
-        print(f"\nPubMed link: https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/")
-    
-    # Save results to file
-    output_file = f"collaborations_dctv_dsf_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    with open(output_file, 'w', encoding='utf-8') as f:
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_file = f"collaborations_dctv_dsf_{timestamp}.txt"
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
         f.write("COLLABORATIVE PUBLICATIONS BETWEEN DCTV AND DSF\n")
         f.write("University of Padova\n")
         f.write(f"Search date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -285,6 +508,20 @@ def main():
         f.write("=" * 80 + "\n\n")
         
         for i, article in enumerate(collaborations, 1):
+            print(f"\n{'='*80}")
+            print(f"[{i}] PMID: {article['pmid']}")
+            print(f"Year: {article['year']}")
+            print(f"Title: {article['title']}")
+            print(f"Journal: {article['journal']}")
+            print(f"Authors: {', '.join(article['authors'][:5])}{'...' if len(article['authors']) > 5 else ''}")
+            print(f"\nDCTV Affiliation(s):")
+            for aff in article['dctv_affiliations'][:2]:
+                print(f"  - {aff[:150]}{'...' if len(aff) > 150 else ''}")
+            print(f"\nDSF Affiliation(s):")
+            for aff in article['dsf_affiliations'][:2]:
+                print(f"  - {aff[:150]}{'...' if len(aff) > 150 else ''}")
+            print(f"\nPubMed link: https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/")
+            
             f.write(f"[{i}] PMID: {article['pmid']}\n")
             f.write(f"Year: {article['year']}\n")
             f.write(f"Title: {article['title']}\n")
@@ -303,9 +540,12 @@ def main():
             f.write("-" * 80 + "\n\n")
     
     # Also save as JSON for further processing
-    json_file = f"collaborations_dctv_dsf_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(collaborations, f, indent=2, ensure_ascii=False)
+    json_file = f"collaborations_dctv_dsf_{timestamp}.json"
+    # Leave out internal fields (leading underscore) such as _joined_lower
+    write_json(json_file, [
+        {key: value for key, value in article.items() if not key.startswith('_')}
+        for article in collaborations
+    ])
     
     print(f"\n\n{'='*80}")
     print(f"Results saved to: {output_file}")
@@ -7,16 +7,152 @@ DCTV = Dipartimento di Scienze Cardio-Toraco-Vascolari e Sanità Pubblica
 DSF = Dipartimento di Scienze del Farmaco (Pharmaceutical and Pharmacological Sciences)
 """
 
-import urllib.request
+import argparse
+import gzip
+import hashlib
+import http.client
+import os
+import sqlite3
 import urllib.parse
 import xml.etree.ElementTree as ET
+import threading
 import time
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
+# NCBI E-utilities identification; with an API key the rate limit rises from 3 to 10 requests/s
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY', '')
+NCBI_TOOL = os.environ.get('NCBI_TOOL', 'articoli_dctv_dsf')
+NCBI_EMAIL = os.environ.get('NCBI_EMAIL', '')
+
+# Concurrent requests, spaced to stay under the NCBI rate limit
+MAX_WORKERS = 9
+REQUEST_INTERVAL = 0.11 if NCBI_API_KEY else 0.34
+
+# Transient NCBI errors (rate limiting, overload) are retried with exponential backoff
+HTTP_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+def wait_for_rate_limit():
+    """Block until the next request slot is available (shared by all threads)."""
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        delay = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + REQUEST_INTERVAL
+    if delay > 0:
+        time.sleep(delay)
+
+def eutils_params(params):
+    """Add the API key and tool/email identification to E-utilities parameters."""
+    params = dict(params, tool=NCBI_TOOL)
+    if NCBI_EMAIL:
+        params['email'] = NCBI_EMAIL
+    if NCBI_API_KEY:
+        params['api_key'] = NCBI_API_KEY
+    return params
+
+def eutils_url(endpoint, params):
+    """Build an E-utilities GET URL."""
+    return BASE_URL + endpoint + "?" + urllib.parse.urlencode(eutils_params(params))
+
+# One kept-alive HTTPS connection per worker thread, so the TLS handshake
+# is paid once per thread rather than once per request
+_connections = threading.local()
+
+def eutils_request(url, data=None):
+    """GET an E-utilities URL, or POST form-encoded `data` to it, and return the body (bytes).
+    
+    Responses are requested gzip-compressed; PubMed XML shrinks about tenfold.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path + "?" + parts.query if parts.query else parts.path
+    
+    for attempt in range(MAX_RETRIES + 1):
+        wait_for_rate_limit()
+        conn = getattr(_connections, 'conn', None)
+        if conn is None:
+            conn = _connections.conn = http.client.HTTPSConnection(parts.netloc, timeout=HTTP_TIMEOUT)
+        try:
+            if data is None:
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            else:
+                conn.request('POST', path, body=data,
+                             headers={'Accept-Encoding': 'gzip',
+                                      'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            body = response.read()
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            _connections.conn = None
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status == 200:
+                return body
+            if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+# On-disk cache for search results and parsed articles (one entry per PMID),
+# so reruns only fetch PMIDs they have not seen before. Set PUBMED_CACHE to
+# an empty string (or pass --no-cache) to disable it.
+CACHE_FILE = os.environ.get('PUBMED_CACHE', 'pubmed_cache.sqlite')
+CACHE_TTL = 7 * 24 * 3600  # seconds
+
+_cache_lock = threading.Lock()
+_cache_db = None
+
+def cache_get(key):
+    """Return the cached JSON value stored under key, or None if missing or expired."""
+    global _cache_db
+    if not CACHE_FILE:
+        return None
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    with _cache_lock:
+        if _cache_db is None:
+            _cache_db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+            _cache_db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, body BLOB)')
+        row = _cache_db.execute('SELECT stored_at, body FROM responses WHERE key = ?', (digest,)).fetchone()
+    if row is None or time.time() - row[0] > CACHE_TTL:
+        return None
+    return orjson.loads(row[1]) if orjson is not None else json.loads(row[1])
+
+def cache_put(key, value):
+    """Store value as JSON under key (the cache is opened by an earlier cache_get)."""
+    cache_put_many([(key, value)])
+
+def cache_put_many(items):
+    """Store (key, value) pairs as JSON in a single transaction."""
+    if not CACHE_FILE or _cache_db is None:
+        return
+    now = time.time()
+    rows = [(hashlib.sha1(key.encode()).hexdigest(), now, json.dumps(value, ensure_ascii=False))
+            for key, value in items]
+    if not rows:
+        return
+    with _cache_lock:
+        _cache_db.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', rows)
+        _cache_db.commit()
+
 # Faculty names from department websites (current staff)
 # Format: "Lastname Firstname" for PubMed author search
 DCTV_FACULTY = [
@@ -103,6 +239,27 @@ DSF_PATTERNS = [
     r"scienze.*del.*farmaco.*padua",
 ]
 
+def split_patterns(patterns):
+    """Split patterns into keyword chains and one regex for the rest.
+    
+    Plain "k1.*k2.*..." patterns become keyword tuples matched with ordered
+    substring scans; the others (whitespace classes, word boundaries, optional
+    groups) are joined into one alternation. Both are matched against
+    already-lowercased text.
+    """
+    chains = []
+    regexes = []
+    for pattern in patterns:
+        keywords = pattern.split(".*")
+        if all(keyword.isalpha() for keyword in keywords):
+            chains.append(tuple(keywords))
+        else:
+            regexes.append(f"(?:{pattern})")
+    return tuple(chains), re.compile("|".join(regexes)) if regexes else None
+
+DCTV_MATCHER = split_patterns(DCTV_PATTERNS)
+DSF_MATCHER = split_patterns(DSF_PATTERNS)
+
 def search_pubmed(query, retmax=200):
     """Search PubMed and return PMIDs."""
     params = {
@@ -111,83 +268,153 @@ def search_pubmed(query, retmax=200):
         'retmax': retmax,
         'retmode': 'json',
     }
-    url = BASE_URL + "esearch.fcgi?" + urllib.parse.urlencode(params)
+    url = eutils_url("esearch.fcgi", params)
+    cache_key = f"esearch|{query}|{retmax}"
+    cached = cache_get(cache_key)
+    if cached is not None:
+        pmids, count = cached
+        return pmids, count
     
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            data = json.loads(response.read().decode())
-            result = data.get('esearchresult', {})
-            count = result.get('count', '0')
-            pmids = result.get('idlist', [])
-            return pmids, int(count)
+        body = eutils_request(url)
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+        result = data.get('esearchresult', {})
+        count = result.get('count', '0')
+        pmids = result.get('idlist', [])
+        # Errors also come back as HTTP 200; only cache real result lists
+        if 'ERROR' not in result and 'idlist' in result:
+            cache_put(cache_key, [pmids, int(count)])
+        return pmids, int(count)
     except Exception as e:
         print(f"  Error: {e}")
         return [], 0
 
+def post_pmids(pmids):
+    """Upload PMIDs to the NCBI history server (EPost); return (WebEnv, QueryKey)."""
+    params = {
+        'db': 'pubmed',
+        'id': ','.join(pmids),
+    }
+    data = urllib.parse.urlencode(eutils_params(params), safe=',').encode()
+    root = ET.fromstring(eutils_request(BASE_URL + "epost.fcgi", data))
+    webenv = root.findtext('WebEnv')
+    query_key = root.findtext('QueryKey')
+    if not webenv or not query_key:
+        raise ValueError(f"no WebEnv/QueryKey in EPost response: {root.findtext('.//ERROR') or root.tag}")
+    return webenv, query_key
+
+def fetch_page(webenv, query_key, retstart, retmax=200):
+    """Fetch and parse one page of articles from the history server."""
+    params = {
+        'db': 'pubmed',
+        'WebEnv': webenv,
+        'query_key': query_key,
+        'retstart': retstart,
+        'retmax': retmax,
+        'retmode': 'xml'
+    }
+    url = eutils_url("efetch.fcgi", params)
+    
+    try:
+        return parse_xml(eutils_request(url))
+    except Exception as e:
+        print(f"  Fetch error: {e}")
+        return []
+
 def fetch_articles(pmids):
-    """Fetch article details including affiliations."""
+    """Fetch article details including affiliations.
+    
+    Articles already in the on-disk cache are reused; only the rest are fetched.
+    """
     if not pmids:
         return []
     
     articles = []
-    # Fetch in batches of 50
-    for i in range(0, len(pmids), 50):
-        batch = pmids[i:i+50]
-        params = {
-            'db': 'pubmed',
-            'id': ','.join(batch),
-            'retmode': 'xml'
-        }
-        url = BASE_URL + "efetch.fcgi?" + urllib.parse.urlencode(params)
-        
-        try:
-            with urllib.request.urlopen(url, timeout=60) as response:
-                xml_data = response.read().decode()
-                articles.extend(parse_xml(xml_data))
-            time.sleep(0.4)
-        except Exception as e:
-            print(f"  Fetch error: {e}")
+    to_fetch = []
+    for pmid in pmids:
+        cached = cache_get(f"article|{pmid}")
+        if cached is None:
+            to_fetch.append(pmid)
+        else:
+            articles.append(cached)
+    if articles:
+        print(f"  {len(articles)} articles from cache, {len(to_fetch)} to fetch")
+    if not to_fetch:
+        return articles
     
+    # Post the PMIDs once, then page through them on the history server
+    # 200 at a time, all pages in flight concurrently
+    try:
+        webenv, query_key = post_pmids(to_fetch)
+    except Exception as e:
+        print(f"  EPost error: {e}")
+        return articles
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        pages = executor.map(lambda retstart: fetch_page(webenv, query_key, retstart),
+                             range(0, len(to_fetch), 200))
+        for page_articles in pages:
+            cache_put_many((f"article|{article['pmid']}", article) for article in page_articles)
+            articles.extend(page_articles)
     return articles
 
 def parse_xml(xml_data):
-    """Parse PubMed XML and extract article info."""
+    """Parse PubMed XML (bytes) and extract article info.
+    
+    Articles are handled as their <PubmedArticle> element closes, collecting
+    every field in one walk of the subtree, and are then cleared from memory.
+    """
     articles = []
     try:
-        root = ET.fromstring(xml_data)
-        for article in root.findall('.//PubmedArticle'):
-            pmid_elem = article.find('.//PMID')
-            pmid = pmid_elem.text if pmid_elem is not None else "Unknown"
+        context = ET.iterparse(BytesIO(xml_data), events=('start', 'end'))
+        _, root = next(context)
+        for event, article in context:
+            if event != 'end' or article.tag != 'PubmedArticle':
+                continue
             
-            title_elem = article.find('.//ArticleTitle')
-            title = title_elem.text if title_elem is not None else "No title"
+            pmid_elem = title_elem = journal_elem = year_elem = medline_date_elem = None
+            affiliations = []
+            seen_affiliations = set()
+            authors = []
             
-            journal_elem = article.find('.//Journal/Title')
+            for elem in article.iter():
+                tag = elem.tag
+                if tag == 'PMID':
+                    if pmid_elem is None:
+                        pmid_elem = elem
+                elif tag == 'ArticleTitle':
+                    if title_elem is None:
+                        title_elem = elem
+                elif tag == 'Journal':
+                    if journal_elem is None:
+                        journal_elem = elem.find('Title')
+                elif tag == 'PubDate':
+                    if year_elem is None:
+                        year_elem = elem.find('Year')
+                    if medline_date_elem is None:
+                        medline_date_elem = elem.find('MedlineDate')
+                elif tag == 'Affiliation':
+                    # AffiliationInfo and old-style affiliations, deduplicated
+                    if elem.text and elem.text not in seen_affiliations:
+                        seen_affiliations.add(elem.text)
+                        affiliations.append(elem.text)
+                elif tag == 'Author':
+                    lastname = elem.find('LastName')
+                    forename = elem.find('ForeName')
+                    if lastname is not None:
+                        name = lastname.text
+                        if forename is not None:
+                            name += " " + forename.text
+                        authors.append(name)
+            
+            pmid = pmid_elem.text if pmid_elem is not None else "Unknown"
+            title = title_elem.text if title_elem is not None else "No title"
             journal = journal_elem.text if journal_elem is not None else ""
             
-            year_elem = article.find('.//PubDate/Year')
             if year_elem is None:
-                year_elem = article.find('.//PubDate/MedlineDate')
+                year_elem = medline_date_elem
             year = year_elem.text[:4] if year_elem is not None and year_elem.text else ""
             
-            affiliations = []
-            for aff in article.findall('.//AffiliationInfo/Affiliation'):
-                if aff.text:
-                    affiliations.append(aff.text)
-            for aff in article.findall('.//Affiliation'):
-                if aff.text and aff.text not in affiliations:
-                    affiliations.append(aff.text)
-            
-            authors = []
-            for author in article.findall('.//Author'):
-                lastname = author.find('LastName')
-                forename = author.find('ForeName')
-                if lastname is not None:
-                    name = lastname.text
-                    if forename is not None:
-                        name += " " + forename.text
-                    authors.append(name)
-            
             articles.append({
                 'pmid': pmid,
                 'title': title,
@@ -196,67 +423,118 @@ def parse_xml(xml_data):
                 'authors': authors,
                 'affiliations': affiliations
             })
+            root.clear()
     except ET.ParseError:
         pass
     return articles
 
-def check_affiliation_match(affiliations, patterns):
-    """Check if any affiliation matches any pattern."""
-    all_affs = ' '.join(affiliations).lower()
-    for pattern in patterns:
-        if re.search(pattern, all_affs, re.IGNORECASE):
+def match_keywords(text, chains):
+    """Check if every keyword of any chain occurs in order in the lowercased text.
+    
+    Equivalent to re.search("k1.*k2.*...") for each chain, but uses str.find
+    so no regex backtracking is involved.
+    """
+    for chain in chains:
+        pos = 0
+        for keyword in chain:
+            pos = text.find(keyword, pos)
+            if pos < 0:
+                break
+            pos += len(keyword)
+        else:
             return True
     return False
 
-def get_matching_affiliations(affiliations, patterns):
-    """Get the specific affiliations that match the patterns."""
+def check_affiliation_match(text_lower, matcher):
+    """Check if lowercased affiliation text matches any of a department's patterns."""
+    chains, regex = matcher
+    if match_keywords(text_lower, chains):
+        return True
+    return regex is not None and regex.search(text_lower) is not None
+
+def get_matching_affiliations(article, matcher):
+    """Get the specific affiliations that match any of a department's patterns."""
     matches = []
-    for aff in affiliations:
-        for pattern in patterns:
-            if re.search(pattern, aff, re.IGNORECASE):
-                if aff not in matches:
-                    matches.append(aff)
-                break
+    seen = set()
+    for aff, aff_lower in zip(article['affiliations'], article['_affs_lower']):
+        if aff in seen:
+            continue
+        seen.add(aff)
+        if check_affiliation_match(aff_lower, matcher):
+            matches.append(aff)
     return matches
 
-def check_author_in_list(authors, faculty_list):
-    """Check if any author is in the faculty list. Strict matching with compound surname handling."""
-    matches = []
-    for author in authors:
-        author_lower = author.lower().strip()
-        
+def build_faculty_index(departments):
+    """Index faculty of all departments by (lowercased lastname, 5-char firstname prefix).
+    
+    Each key maps to the set of departments with a faculty member matching it.
+    Faculty format: "Lastname Firstname" or "Compound Lastname Firstname"
+    (e.g. "De Filippis Vincenzo", "Dalla Via Lisa"): the last word is the
+    firstname, everything else is the lastname. Firstnames shorter than 5
+    chars can never satisfy the strict match and are left out.
+    """
+    index = {}
+    for dept, faculty_list in departments.items():
         for faculty in faculty_list:
-            fac_lower = faculty.lower().strip()
-            fac_parts = fac_lower.split()
-            
+            fac_parts = faculty.lower().strip().split()
             if len(fac_parts) < 2:
                 continue
-            
-            # Handle compound surnames (e.g., "De Filippis Vincenzo", "Dalla Via Lisa")
-            # Faculty format: "Lastname Firstname" or "Compound Lastname Firstname"
-            fac_firstname = fac_parts[-1]  # Last word is firstname
-            fac_lastname = ' '.join(fac_parts[:-1])  # Everything else is lastname
-            
-            # Author format from PubMed: "Lastname Firstname" 
-            author_parts = author_lower.split()
-            if len(author_parts) < 2:
+            fac_firstname = fac_parts[-1]
+            if len(fac_firstname) < 5:
                 continue
-            
-            # Try to match compound surnames
-            # Check if author starts with faculty lastname and ends with matching firstname
-            author_firstname = author_parts[-1]
-            author_lastname = ' '.join(author_parts[:-1])
-            
-            # Strict match: exact lastname AND firstname at least 5 chars match
-            if (author_lastname == fac_lastname and 
-                len(author_firstname) >= 5 and 
-                len(fac_firstname) >= 5 and
-                author_firstname[:5] == fac_firstname[:5]):
-                matches.append(author)
-                break
+            index.setdefault((' '.join(fac_parts[:-1]), fac_firstname[:5]), set()).add(dept)
+    return index
+
+FACULTY_INDEX = build_faculty_index({'dctv': DCTV_FACULTY, 'dsf': DSF_FACULTY})
+
+@lru_cache(maxsize=8192)
+def split_author(author):
+    """Split "Lastname Firstname" into (lowercased lastname, firstname).
+    
+    Returns ('', '') for single-word names. Memoized, since the same authors
+    recur across many articles.
+    """
+    author_parts = author.lower().strip().split()
+    if len(author_parts) < 2:
+        return '', ''
+    return ' '.join(author_parts[:-1]), author_parts[-1]
+
+def match_faculty_authors(authors):
+    """Match authors against both departments' faculty in one pass.
+    
+    Strict matching with compound surname handling; returns the matched
+    authors per department.
+    """
+    matches = {'dctv': [], 'dsf': []}
+    for author in authors:
+        # Author format from PubMed: "Lastname Firstname"
+        author_lastname, author_firstname = split_author(author)
+        
+        # Strict match: exact lastname AND firstname at least 5 chars match
+        if len(author_firstname) < 5:
+            continue
+        for dept in FACULTY_INDEX.get((author_lastname, author_firstname[:5]), ()):
+            matches[dept].append(author)
     return matches
 
+def write_json(path, data):
+    """Write data as indented UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
 def main():
+    global CACHE_FILE
+    parser = argparse.ArgumentParser(description="Search PubMed for DCTV x DSF collaborations.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore the on-disk cache and query PubMed again")
+    args = parser.parse_args()
+    if args.no_cache:
+        CACHE_FILE = ''
+    
     print("=" * 80)
     print("PUBMED COLLABORATION SEARCH: DCTV x DSF")
     print("University of Padova")
@@ -279,12 +557,13 @@ def main():
         '"Legal Medicine"[Affiliation] AND (Padova[Affiliation] OR Padua[Affiliation]) AND ("Pharmaceutical"[Affiliation] OR "Pharmacological"[Affiliation])',
     ]
     
-    for q in affiliation_queries:
-        print(f"\nQuery: {q[:80]}...")
-        pmids, count = search_pubmed(q, retmax=300)
-        print(f"  Found: {count} total, retrieved {len(pmids)}")
-        all_pmids.update(pmids)
-        time.sleep(0.5)
+    # One OR'd search returns the union of the queries, deduplicated by PubMed
+    combined_query = "(" + ") OR (".join(affiliation_queries) + ")"
+    pmids, count = search_pubmed(combined_query, retmax=900)
+    
+    print(f"\nQuery: {len(affiliation_queries)} affiliation queries combined with OR")
+    print(f"  Found: {count} total, retrieved {len(pmids)}")
+    all_pmids.update(pmids)
     
     # STRATEGY 2: Cross-search faculty names
     print("\n" + "=" * 60)
@@ -301,31 +580,23 @@ def main():
     
     print(f"\nCross-searching {len(key_dctv)} DCTV x {len(key_dsf)} DSF faculty...")
     
-    # Search for DCTV faculty with DSF affiliation
-    for dctv_name in key_dctv:
-        parts = dctv_name.split()
-        lastname = parts[0]
-        firstname = parts[1] if len(parts) > 1 else ""
-        
-        query = f'{lastname} {firstname}[Author] AND (Padova[Affiliation] OR Padua[Affiliation]) AND ("Pharmaceutical"[Affiliation] OR "Pharmacological"[Affiliation] OR "Farmaco"[Affiliation])'
-        pmids, count = search_pubmed(query, retmax=50)
-        if pmids:
-            print(f"  {dctv_name}: {len(pmids)} potential")
-            all_pmids.update(pmids)
-        time.sleep(0.3)
-    
-    # Search for DSF faculty with DCTV affiliation
-    for dsf_name in key_dsf:
-        parts = dsf_name.split()
-        lastname = parts[0]
-        firstname = parts[1] if len(parts) > 1 else ""
-        
-        query = f'{lastname} {firstname}[Author] AND (Padova[Affiliation] OR Padua[Affiliation]) AND ("Cardiac"[Affiliation] OR "Cardio"[Affiliation] OR "Public Health"[Affiliation] OR "Vascular"[Affiliation])'
-        pmids, count = search_pubmed(query, retmax=50)
-        if pmids:
-            print(f"  {dsf_name}: {len(pmids)} potential")
-            all_pmids.update(pmids)
-        time.sleep(0.3)
+    # One OR'd author query per department instead of one query per name
+    dctv_author_clause = " OR ".join(f'"{name}"[Author]' for name in key_dctv)
+    dsf_author_clause = " OR ".join(f'"{name}"[Author]' for name in key_dsf)
+    
+    cross_queries = [
+        # DCTV faculty with DSF affiliation
+        ("DCTV faculty", f'({dctv_author_clause}) AND (Padova[Affiliation] OR Padua[Affiliation]) AND ("Pharmaceutical"[Affiliation] OR "Pharmacological"[Affiliation] OR "Farmaco"[Affiliation])'),
+        # DSF faculty with DCTV affiliation
+        ("DSF faculty", f'({dsf_author_clause}) AND (Padova[Affiliation] OR Padua[Affiliation]) AND ("Cardiac"[Affiliation] OR "Cardio"[Affiliation] OR "Public Health"[Affiliation] OR "Vascular"[Affiliation])'),
+    ]
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda item: search_pubmed(item[1], retmax=600), cross_queries))
+    
+    for (label, _), (pmids, count) in zip(cross_queries, results):
+        print(f"  {label}: {count} total, retrieved {len(pmids)} potential")
+        all_pmids.update(pmids)
     
     print(f"\n\nTotal unique PMIDs to analyze: {len(all_pmids)}")
     
@@ -338,38 +609,37 @@ def main():
     print("PHASE 3: FETCHING AND ANALYZING ARTICLES")
     print("=" * 60)
     
-    articles = fetch_articles(list(all_pmids))
+    articles = fetch_articles(sorted(all_pmids))
     print(f"Fetched {len(articles)} articles")
     
     # Filter for true collaborations
     collaborations = []
     
     for article in articles:
-        all_affs = ' '.join(article['affiliations']).lower()
-        is_padova = 'padov' in all_affs or 'padua' in all_affs
-        
-        # Check affiliation patterns
-        has_dctv_aff = check_affiliation_match(article['affiliations'], DCTV_PATTERNS)
-        has_dsf_aff = check_affiliation_match(article['affiliations'], DSF_PATTERNS)
-        
-        # Check faculty names
-        dctv_authors = check_author_in_list(article['authors'], DCTV_FACULTY)
-        dsf_authors = check_author_in_list(article['authors'], DSF_FACULTY)
+        # Lowercase each article's affiliations once for all the checks below
+        article['_affs_lower'] = [aff.lower() for aff in article['affiliations']]
+        article['_affs_joined_lower'] = ' '.join(article['_affs_lower'])
         
         # COLLABORATION RULE: 
         # Both affiliations must be present (DCTV AND DSF in Padova)
         # Faculty names are used only for additional info, not for filtering
         # This avoids false positives from name matching
-        
-        has_both_affiliations = has_dctv_aff and has_dsf_aff and is_padova
-        
-        if not has_both_affiliations:
+        # Checks run cheapest first, so most articles are dropped early
+        all_affs = article['_affs_joined_lower']
+        if not ('padov' in all_affs or 'padua' in all_affs):
             continue
+        if not check_affiliation_match(all_affs, DCTV_MATCHER):
+            continue
+        if not check_affiliation_match(all_affs, DSF_MATCHER):
+            continue
+        
+        # Check faculty names
+        author_matches = match_faculty_authors(article['authors'])
         
-        article['dctv_affiliations'] = get_matching_affiliations(article['affiliations'], DCTV_PATTERNS)
-        article['dsf_affiliations'] = get_matching_affiliations(article['affiliations'], DSF_PATTERNS)
-        article['dctv_authors'] = dctv_authors
-        article['dsf_authors'] = dsf_authors
+        article['dctv_affiliations'] = get_matching_affiliations(article, DCTV_MATCHER)
+        article['dsf_affiliations'] = get_matching_affiliations(article, DSF_MATCHER)
+        article['dctv_authors'] = author_matches['dctv']
+        article['dsf_authors'] = author_matches['dsf']
         collaborations.append(article)
     
     # Remove duplicates by PMID
@@ -388,33 +658,10 @@ def main():
     print(f"FOUND {len(collaborations)} COLLABORATIVE PUBLICATIONS")
     print(f"{'='*60}")
     
-    # Display results
-    for i, article in enumerate(collaborations, 1):
-        print(f"\n{'='*80}")
-        print(f"[{i}] PMID: {article['pmid']}")
-        print(f"Year: {article['year']}")
-        print(f"Title: {article['title'][:100]}{'...' if len(article['title']) > 100 else ''}")
-        print(f"Journal: {article['journal']}")
-        print(f"Authors: {', '.join(article['authors'][:6])}{'...' if len(article['authors']) > 6 else ''}")
-        
-        if article['dctv_authors']:
-            print(f"\n  DCTV Authors: {', '.join(article['dctv_authors'])}")
-        if article['dctv_affiliations']:
-            print(f"  DCTV Affiliation: {article['dctv_affiliations'][0][:100]}...")
-        
-        if article['dsf_authors']:
-            print(f"\n  DSF Authors: {', '.join(article['dsf_authors'])}")
-        if article['dsf_affiliations']:
-            print(f"  DSF Affiliation: {article['dsf_affiliations'][0][:100]}...")
-        
-        print(f"\n  PubMed: https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/")
-    
-    # Save results
+    # Display results and write the text report in the same pass
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Save text report
     output_file = f"collaborations_dctv_dsf_{timestamp}.txt"
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
         f.write("COLLABORATIVE PUBLICATIONS: DCTV x DSF\n")
         f.write("University of Padova\n")
         f.write(f"Search date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -422,6 +669,25 @@ def main():
         f.write("=" * 80 + "\n\n")
         
         for i, article in enumerate(collaborations, 1):
+            print(f"\n{'='*80}")
+            print(f"[{i}] PMID: {article['pmid']}")
+            print(f"Year: {article['year']}")
+            print(f"Title: {article['title'][:100]}{'...' if len(article['title']) > 100 else ''}")
+            print(f"Journal: {article['journal']}")
+            print(f"Authors: {', '.join(article['authors'][:6])}{'...' if len(article['authors']) > 6 else ''}")
+            
+            if article['dctv_authors']:
+                print(f"\n  DCTV Authors: {', '.join(article['dctv_authors'])}")
+            if article['dctv_affiliations']:
+                print(f"  DCTV Affiliation: {article['dctv_affiliations'][0][:100]}...")
+            
+            if article['dsf_authors']:
+                print(f"\n  DSF Authors: {', '.join(article['dsf_authors'])}")
+            if article['dsf_affiliations']:
+                print(f"  DSF Affiliation: {article['dsf_affiliations'][0][:100]}...")
+            
+            print(f"\n  PubMed: https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/")
+            
             f.write(f"[{i}] PMID: {article['pmid']}\n")
             f.write(f"Year: {article['year']}\n")
             f.write(f"Title: {article['title']}\n")
@@ -435,10 +701,12 @@ def main():
             f.write(f"\nPubMed: https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/\n")
             f.write("-" * 80 + "\n\n")
     
-    # Save JSON
+    # Save JSON, leaving out the internal, underscore-prefixed working fields
     json_file = f"collaborations_dctv_dsf_{timestamp}.json"
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(collaborations, f, indent=2, ensure_ascii=False)
+    write_json(json_file, [
+        {key: value for key, value in article.items() if not key.startswith('_')}
+        for article in collaborations
+    ])
     
     print(f"\n\n{'='*80}")
     print(f"Results saved to: {output_file}")